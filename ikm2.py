@@ -10,172 +10,690 @@
 поддеревья, соответствующие формулам ((f1±f2)*f3) и (f1*(f2±f3)).
 """
 
+LOAD_CONST, LOAD_VAR, ADD, SUB, MUL, DIV, NEG = range(7)
+_OPCODES = {'+': ADD, '-': SUB, '*': MUL, '/': DIV}
+
+_INT64_MIN = -2 ** 63
+_INT64_MAX = 2 ** 63 - 1
+
+KIND_VALUE, KIND_UNARY, KIND_BINARY = range(3)
+_ADDSUB = frozenset('+-')
+# Поддеревья не глубже этого вычисляются рекурсивно, более глубокие — через стек.
+_MAX_RECURSIVE_DEPTH = 200
+
+TOKEN_NUM, TOKEN_VAR, TOKEN_OP, TOKEN_LPAR, TOKEN_RPAR, TOKEN_END, TOKEN_OTHER = range(7)
+
+_PRIO_TABLE = bytearray(128)
+_PRIO_TABLE[ord('+')] = _PRIO_TABLE[ord('-')] = 1
+_PRIO_TABLE[ord('*')] = _PRIO_TABLE[ord('/')] = 2
+_UNARY_MINUS = '~'
+_PRIO_TABLE[ord(_UNARY_MINUS)] = 3
+
+_UNSET = object()
+# Таблица хэш-консинга живёт один разбор: Parser.parse() очищает её перед
+# построением дерева, поэтому узлы прежних выражений в ней не копятся.
+_INTERN = {}
+_SIMPLIFY_CACHE = {}
+
 
 class Node:
+    __slots__ = ()
+    KIND = KIND_VALUE
+
     def evaluate(self, variables):
         raise NotImplementedError()
 
     def simplify(self):
         return self
 
+    def _simplify_local(self):
+        return self
+
+    def evaluate_batch(self, variables):
+        return _evaluate_batch(self, variables)
+
     def to_infix(self):
-        raise NotImplementedError()
+        return to_infix_iter(self)
+
+    def __eq__(self, other):
+        return self is other
+
+    def __hash__(self):
+        return self._hash
 
 
 class ValueNode(Node):
+    __slots__ = ('value', '_hash')
+    KIND = KIND_VALUE
+    _depth = 1
+
     def __init__(self, value):
         self.value = value
+        self._hash = hash(('v', value))
+
+    @classmethod
+    def make(cls, value):
+        key = (cls, value)
+        node = _INTERN.get(key)
+        if node is None:
+            node = _INTERN[key] = cls(value)
+        return node
 
     def evaluate(self, variables):
-        if isinstance(self.value, int):
-            return self.value
-        if self.value in variables:
-            return variables[self.value]
-        raise ValueError("Переменная '{}' не определена.".format(self.value))
+        value = self.value
+        if type(value) is int:
+            return value
+        result = variables.get(value, _UNSET)
+        if result is _UNSET:
+            raise ValueError("Переменная '{}' не определена.".format(value))
+        return result
 
     def to_infix(self):
         return str(self.value)
 
-    def __eq__(self, other):
-        return isinstance(other, ValueNode) and self.value == other.value
-
 
 class UnaryMinusNode(Node):
+    __slots__ = ('child', '_hash', '_depth')
+    KIND = KIND_UNARY
+
     def __init__(self, child):
         self.child = child
+        self._hash = hash(('u', id(child)))
+        self._depth = child._depth + 1
+
+    @classmethod
+    def make(cls, child):
+        if child.KIND == KIND_VALUE and isinstance(child.value, int):
+            return ValueNode.make(-child.value)
+        key = (cls, id(child))
+        node = _INTERN.get(key)
+        if node is None:
+            node = _INTERN[key] = cls(child)
+        return node
 
     def evaluate(self, variables):
+        if self._depth > _MAX_RECURSIVE_DEPTH:
+            return _evaluate_tree(self, variables)
         return -self.child.evaluate(variables)
 
-    def simplify(self):
-        self.child = self.child.simplify()
-        if isinstance(self.child, ValueNode) and isinstance(self.child.value, int):
-            return ValueNode(-self.child.value)
-        return self
-
     def to_infix(self):
-        return "-({})".format(self.child.to_infix())
+        if self._depth > _MAX_RECURSIVE_DEPTH:
+            return to_infix_iter(self)
+        return '-(' + self.child.to_infix() + ')'
+
+    def simplify(self):
+        return _simplify_tree(self)
 
 
 class BinaryOpNode(Node):
-    def __init__(self, op, left, right):
-        self.op = op
+    __slots__ = ('left', 'right', '_hash', '_depth')
+    KIND = KIND_BINARY
+    OP_STR = None
+
+    def __init__(self, left, right):
         self.left = left
         self.right = right
+        self._hash = hash((self.OP_STR, id(left), id(right)))
+        self._depth = max(left._depth, right._depth) + 1
+
+    @staticmethod
+    def make(op, left, right):
+        if (left.KIND == KIND_VALUE and right.KIND == KIND_VALUE
+                and isinstance(left.value, int) and isinstance(right.value, int)
+                and not (op == '/' and right.value == 0)):
+            return ValueNode.make(_BIN[op]._apply(left.value, right.value))
+        key = (op, id(left), id(right))
+        node = _INTERN.get(key)
+        if node is None:
+            node = _INTERN[key] = _BIN[op](left, right)
+        return node
 
-    def evaluate(self, variables):
-        left_val = self.left.evaluate(variables)
-        right_val = self.right.evaluate(variables)
+    @staticmethod
+    def _apply(left_val, right_val):
+        raise NotImplementedError()
+
+    def to_infix(self):
+        if self._depth > _MAX_RECURSIVE_DEPTH:
+            return to_infix_iter(self)
+        return '(' + self.left.to_infix() + self.INFIX_OP + self.right.to_infix() + ')'
 
-        if self.op == '+':
-            return left_val + right_val
-        if self.op == '-':
-            return left_val - right_val
-        if self.op == '*':
-            return left_val * right_val
-        if self.op == '/':
-            if right_val == 0:
-                raise ZeroDivisionError("Деление на ноль")
-            return left_val // right_val
-        raise ValueError("Неизвестный оператор: {}".format(self.op))
+    def _apply_batch(self, left_val, right_val):
+        return self._apply(left_val, right_val)
 
     def simplify(self):
-        self.left = self.left.simplify()
-        self.right = self.right.simplify()
-
-        if (self.op in ('+', '-') and isinstance(self.left, BinaryOpNode)
-                and isinstance(self.right, BinaryOpNode)):
-            if self.left.op == '*' and self.right.op == '*':
-                l1, l2 = self.left.left, self.left.right
-                r1, r2 = self.right.left, self.right.right
-                if l2 == r2:
-                    return BinaryOpNode('*', BinaryOpNode(self.op, l1, r1).simplify(), l2).simplify()
-                if l1 == r1:
-                    return BinaryOpNode('*', l1, BinaryOpNode(self.op, l2, r2).simplify()).simplify()
-
-        if isinstance(self.left, ValueNode) and isinstance(self.right, ValueNode):
-            if isinstance(self.left.value, int) and isinstance(self.right.value, int):
-                return ValueNode(self.evaluate({}))
+        return _simplify_tree(self)
 
+    def _simplify_local(self):
+        if self.OP_STR in _ADDSUB:
+            return _factor_terms(self)
         return self
 
-    def to_infix(self):
-        return "({} {} {})".format(self.left.to_infix(), self.op, self.right.to_infix())
 
-    def __eq__(self, other):
-        return (
-            isinstance(other, BinaryOpNode)
-            and self.op == other.op
-            and self.left == other.left
-            and self.right == other.right
-        )
+class AddNode(BinaryOpNode):
+    __slots__ = ()
+    OP_STR = '+'
+    INFIX_OP = ' + '
+
+    def evaluate(self, variables):
+        if self._depth > _MAX_RECURSIVE_DEPTH:
+            return _evaluate_tree(self, variables)
+        return self.left.evaluate(variables) + self.right.evaluate(variables)
 
+    @staticmethod
+    def _apply(left_val, right_val):
+        return left_val + right_val
 
-def parse_expression(expr):
-    expr = expr.replace(' ', '')
-    pos = 0
-
-    def current():
-        if pos < len(expr):
-            return expr[pos]
-        return ''
-
-    def consume():
-        nonlocal pos
-        ch = current()
-        pos += 1
-        return ch
-
-    def priority(op):
-        priorities = {'+': 1, '-': 1, '*': 2, '/': 2}
-        return priorities.get(op, 0)
-
-    def parse_number():
-        nonlocal pos
-        start = pos
-        while current().isdigit():
-            pos += 1
-        return ValueNode(int(expr[start:pos]))
-
-    def parse_primary():
-        ch = current()
-        if ch == '(':
-            consume()
-            node = parse_expression_inner()
-            if current() != ')':
+
+class SubNode(BinaryOpNode):
+    __slots__ = ()
+    OP_STR = '-'
+    INFIX_OP = ' - '
+
+    def evaluate(self, variables):
+        if self._depth > _MAX_RECURSIVE_DEPTH:
+            return _evaluate_tree(self, variables)
+        return self.left.evaluate(variables) - self.right.evaluate(variables)
+
+    @staticmethod
+    def _apply(left_val, right_val):
+        return left_val - right_val
+
+
+class MulNode(BinaryOpNode):
+    __slots__ = ()
+    OP_STR = '*'
+    INFIX_OP = ' * '
+
+    def evaluate(self, variables):
+        if self._depth > _MAX_RECURSIVE_DEPTH:
+            return _evaluate_tree(self, variables)
+        return self.left.evaluate(variables) * self.right.evaluate(variables)
+
+    @staticmethod
+    def _apply(left_val, right_val):
+        return left_val * right_val
+
+
+class DivNode(BinaryOpNode):
+    __slots__ = ()
+    OP_STR = '/'
+    INFIX_OP = ' / '
+
+    def evaluate(self, variables):
+        if self._depth > _MAX_RECURSIVE_DEPTH:
+            return _evaluate_tree(self, variables)
+        left_val = self.left.evaluate(variables)
+        right_val = self.right.evaluate(variables)
+        if right_val == 0:
+            raise ZeroDivisionError("Деление на ноль")
+        return left_val // right_val
+
+    @staticmethod
+    def _apply(left_val, right_val):
+        if right_val == 0:
+            raise ZeroDivisionError("Деление на ноль")
+        return left_val // right_val
+
+    def _apply_batch(self, left_val, right_val):
+        if (right_val == 0).any():
+            raise ZeroDivisionError("Деление на ноль")
+        return left_val // right_val
+
+
+_BIN = {'+': AddNode, '-': SubNode, '*': MulNode, '/': DivNode}
+
+
+def _iter_postorder(root):
+    """Возвращает узлы дерева в порядке «потомки раньше родителя» без рекурсии."""
+    order = []
+    stack = [root]
+    while stack:
+        node = stack.pop()
+        order.append(node)
+        if node.KIND == KIND_BINARY:
+            stack.append(node.left)
+            stack.append(node.right)
+        elif node.KIND == KIND_UNARY:
+            stack.append(node.child)
+    order.reverse()
+    return order
+
+
+def _evaluate_tree(root, variables):
+    """Вычисляет глубокое дерево без рекурсии; неглубокие поддеревья — через evaluate()."""
+    values = []
+    # None в стеке отмечает, что под ним лежит узел, чьи потомки уже вычислены.
+    stack = [root]
+    while stack:
+        node = stack.pop()
+        if node is None:
+            node = stack.pop()
+            if node.KIND == KIND_BINARY:
+                right_val = values.pop()
+                values[-1] = node._apply(values[-1], right_val)
+            else:
+                values[-1] = -values[-1]
+        elif node._depth <= _MAX_RECURSIVE_DEPTH:
+            values.append(node.evaluate(variables))
+        elif node.KIND == KIND_BINARY:
+            stack += (node, None, node.right, node.left)
+        else:
+            stack += (node, None, node.child)
+    return values.pop()
+
+
+_numpy = None
+
+
+def _load_numpy():
+    """Импортирует numpy при первом пакетном вычислении; None, если его нет."""
+    global _numpy
+    if _numpy is None:
+        try:
+            import numpy
+        except ImportError:
+            _numpy = False
+        else:
+            _numpy = numpy
+    return _numpy or None
+
+
+def _evaluate_batch(root, variables):
+    """Вычисляет дерево сразу для наборов значений: variables[имя] — список чисел."""
+    size = max((len(values) for values in variables.values()), default=1)
+    for values in variables.values():
+        if len(values) not in (1, size):
+            raise ValueError("Списки значений переменных должны быть одной длины.")
+
+    np = _load_numpy()
+    if np is None:
+        rows = [{name: values[i if len(values) > 1 else 0] for name, values in variables.items()}
+                for i in range(size)]
+        return [_evaluate_tree(root, row) for row in rows]
+
+    # Столбцы хранят целые Python (dtype=object): результат точен при любой
+    # величине чисел и совпадает с построчным вычислением без numpy.
+    columns = {name: np.array(values, dtype=object) for name, values in variables.items()}
+    values = []
+    for node in _iter_postorder(root):
+        if node.KIND == KIND_BINARY:
+            right_val = values.pop()
+            left_val = values.pop()
+            values.append(node._apply_batch(left_val, right_val))
+        elif node.KIND == KIND_UNARY:
+            values.append(-values.pop())
+        elif isinstance(node.value, int):
+            values.append(np.full(size, node.value, dtype=object))
+        elif node.value in columns:
+            values.append(columns[node.value])
+        else:
+            raise ValueError("Переменная '{}' не определена.".format(node.value))
+    return np.broadcast_to(values.pop(), size).tolist()
+
+
+def _simplify_tree(root):
+    cached = _SIMPLIFY_CACHE.get(root)
+    if cached is not None:
+        return cached
+
+    # Звенья цепочки + и - под таким же узлом только пересобираются:
+    # множители выносятся один раз, в корне цепочки.
+    links = {}
+    results = []
+    stack = [(root, False, False)]
+    while stack:
+        node, expanded, in_chain = stack.pop()
+        if node.KIND == KIND_VALUE:
+            results.append(node.simplify())
+            continue
+        is_link = in_chain and node.KIND == KIND_BINARY and node.OP_STR in _ADDSUB
+        memo = links if is_link else _SIMPLIFY_CACHE
+        if not expanded:
+            cached = memo.get(node)
+            if cached is not None:
+                results.append(cached)
+                continue
+            stack.append((node, True, in_chain))
+            if node.KIND == KIND_BINARY:
+                chain = node.OP_STR in _ADDSUB
+                stack.append((node.right, False, chain))
+                stack.append((node.left, False, chain))
+            else:
+                stack.append((node.child, False, False))
+            continue
+
+        if node.KIND == KIND_BINARY:
+            right = results.pop()
+            left = results.pop()
+            result = node
+            if left is not node.left or right is not node.right:
+                result = BinaryOpNode.make(node.OP_STR, left, right)
+            if not is_link:
+                result = result._simplify_local()
+        else:
+            child = results.pop()
+            result = node
+            if child is not node.child:
+                result = UnaryMinusNode.make(child)
+        memo[node] = result
+        results.append(result)
+    return results.pop()
+
+
+def _flatten_terms(root):
+    """Раскладывает цепочку из + и - на слагаемые (знак, узел) слева направо."""
+    terms = []
+    stack = [(root, 1)]
+    while stack:
+        node, sign = stack.pop()
+        if node.KIND == KIND_BINARY and node.OP_STR in _ADDSUB:
+            stack.append((node.right, -sign if node.OP_STR == '-' else sign))
+            stack.append((node.left, sign))
+        else:
+            terms.append((sign, node))
+    return terms
+
+
+def _factor_terms(root):
+    """Выносит общие множители из произведений цепочки root, пока это возможно."""
+    terms = _flatten_terms(root)
+    rewrote = False
+    while True:
+        grouped = _group_products(terms)
+        if grouped is None:
+            break
+        terms = grouped
+        rewrote = True
+
+    if not rewrote:
+        return root
+    result = terms[0][1]
+    for sign, node in terms[1:]:
+        result = BinaryOpNode.make('+' if sign > 0 else '-', result, node)
+    return result
+
+
+def _group_products(terms):
+    """Один проход группировки: произведения с общим множителем сводятся в одно."""
+    owners = {}
+    groups = {}
+    kept = [True] * len(terms)
+    for index, (sign, node) in enumerate(terms):
+        if not (node.KIND == KIND_BINARY and node.OP_STR == '*'):
+            continue
+        for shared in (node.right, node.left):
+            first = owners.get(id(shared))
+            if first is not None:
+                break
+        else:
+            owners.setdefault(id(node.right), index)
+            owners.setdefault(id(node.left), index)
+            continue
+
+        other = node.left if shared is node.right else node.right
+        group = groups.get(first)
+        if group is None:
+            first_sign, first_node = terms[first]
+            on_right = first_node.right is shared and (node.right is shared
+                                                        or first_node.left is not shared)
+            first_other = first_node.left if on_right else first_node.right
+            if first_other is not shared and owners.get(id(first_other)) == first:
+                del owners[id(first_other)]
+            group = groups[first] = (shared, on_right, [(first_sign, first_other)])
+        group[2].append((sign, other))
+        kept[index] = False
+
+    if not groups:
+        return None
+    grouped = []
+    for index, term in enumerate(terms):
+        if not kept[index]:
+            continue
+        group = groups.get(index)
+        if group is None:
+            grouped.append(term)
+            continue
+        shared, on_right, members = group
+        first_sign, inner = members[0]
+        for sign, other in members[1:]:
+            inner = BinaryOpNode.make('+' if sign == first_sign else '-', inner, other)
+        inner = inner._simplify_local()
+        if on_right:
+            grouped.append((first_sign, BinaryOpNode.make('*', inner, shared)))
+        else:
+            grouped.append((first_sign, BinaryOpNode.make('*', shared, inner)))
+    return grouped
+
+
+def to_infix_iter(root):
+    out = []
+    # В стеке лежат узлы и готовые куски строки: скобки и знаки операций.
+    stack = [root]
+    while stack:
+        item = stack.pop()
+        if type(item) is str:
+            out.append(item)
+        elif item._depth <= _MAX_RECURSIVE_DEPTH:
+            out.append(item.to_infix())
+        elif item.KIND == KIND_BINARY:
+            out.append('(')
+            stack += (')', item.right, item.INFIX_OP, item.left)
+        elif item.KIND == KIND_UNARY:
+            out.append('-(')
+            stack += (')', item.child)
+        else:
+            out.append(str(item.value))
+    return ''.join(out)
+
+
+def _fits_int64(values):
+    return all(_INT64_MIN <= value <= _INT64_MAX for value in values)
+
+
+def compile_to_bytecode(root, jit=False):
+    """Переводит дерево в постфиксную программу из пар (код операции, операнд).
+
+    При jit=True и установленном numba программа упаковывается в массивы для
+    скомпилированного цикла. Он считает в int64: промежуточные результаты вне
+    этого диапазона переполняются, поэтому режим включается только явно.
+    """
+    ops = []
+    consts = []
+    var_slots = []
+    const_index = {}
+    var_index = {}
+    for node in _iter_postorder(root):
+        if node.KIND == KIND_BINARY:
+            ops += (_OPCODES[node.OP_STR], 0)
+        elif node.KIND == KIND_UNARY:
+            ops += (NEG, 0)
+        elif isinstance(node.value, int):
+            index = const_index.setdefault(node.value, len(consts))
+            if index == len(consts):
+                consts.append(node.value)
+            ops += (LOAD_CONST, index)
+        else:
+            index = var_index.setdefault(node.value, len(var_slots))
+            if index == len(var_slots):
+                var_slots.append(node.value)
+            ops += (LOAD_VAR, index)
+    if jit and _fits_int64(consts) and _load_jit() is not None:
+        import numpy as np
+        return np.array(ops, np.int32), np.array(consts, np.int64), tuple(var_slots)
+    return ops, consts, tuple(var_slots)
+
+
+def _run_bytecode(ops, consts, var_values, stack):
+    top = 0
+    for pc in range(0, len(ops), 2):
+        code = ops[pc]
+        if code == LOAD_CONST:
+            stack[top] = consts[ops[pc + 1]]
+            top += 1
+        elif code == LOAD_VAR:
+            stack[top] = var_values[ops[pc + 1]]
+            top += 1
+        elif code == NEG:
+            stack[top - 1] = -stack[top - 1]
+        else:
+            top -= 1
+            left_val = stack[top - 1]
+            right_val = stack[top]
+            if code == ADD:
+                stack[top - 1] = left_val + right_val
+            elif code == SUB:
+                stack[top - 1] = left_val - right_val
+            elif code == MUL:
+                stack[top - 1] = left_val * right_val
+            else:
+                if right_val == 0:
+                    raise ZeroDivisionError("Деление на ноль")
+                stack[top - 1] = left_val // right_val
+    return stack[0]
+
+
+_run_bytecode_jit = None
+
+
+def _load_jit():
+    """Компилирует цикл через numba при первом обращении; None, если numba нет."""
+    global _run_bytecode_jit
+    if _run_bytecode_jit is None:
+        try:
+            from numba import njit
+        except ImportError:
+            _run_bytecode_jit = False
+        else:
+            _run_bytecode_jit = njit(cache=True)(_run_bytecode)
+    return _run_bytecode_jit or None
+
+
+def run_bytecode(program, variables):
+    ops, consts, var_slots = program
+    var_values = []
+    for name in var_slots:
+        if name not in variables:
+            raise ValueError("Переменная '{}' не определена.".format(name))
+        var_values.append(variables[name])
+    stack_size = len(ops) // 2
+    if type(ops) is list:
+        return _run_bytecode(ops, consts, var_values, [0] * stack_size)
+    if not _fits_int64(var_values):
+        return _run_bytecode(ops.tolist(), consts.tolist(), var_values, [0] * stack_size)
+    import numpy as np
+    return int(_run_bytecode_jit(ops, consts, np.array(var_values, np.int64),
+                                 np.empty(stack_size, np.int64)))
+
+
+def _tokenize(expr, names):
+    """Разбивает строку на лексемы (вид, значение), собирая имена переменных в names.
+
+    Пробелы, как и прежде, отбрасываются везде, в том числе внутри числа:
+    '2 11' читается как 211. Буквы и цифры за пределами ASCII проверяются
+    через str.isalpha/str.isdigit.
+    """
+    tokens = []
+    i = 0
+    n = len(expr)
+    while i < n:
+        ch = expr[i]
+        code = ord(ch)
+        if 48 <= code <= 57 or (code > 127 and ch.isdigit()):
+            start = i
+            i += 1
+            while i < n:
+                code = ord(expr[i])
+                if not (48 <= code <= 57 or code == 32 or (code > 127 and expr[i].isdigit())):
+                    break
+                i += 1
+            tokens.append((TOKEN_NUM, expr[start:i].replace(' ', '')))
+            continue
+        if 65 <= code <= 90 or 97 <= code <= 122 or (code > 127 and ch.isalpha()):
+            tokens.append((TOKEN_VAR, ch))
+            names.add(ch)
+        elif ch in '+-*/':
+            tokens.append((TOKEN_OP, ch))
+        elif ch == '(':
+            tokens.append((TOKEN_LPAR, ch))
+        elif ch == ')':
+            tokens.append((TOKEN_RPAR, ch))
+        elif ch != ' ':
+            tokens.append((TOKEN_OTHER, ch))
+        i += 1
+    tokens.append((TOKEN_END, ''))
+    return tokens
+
+
+class Parser:
+    def __init__(self, expr):
+        self.vars = set()
+        self.tokens = _tokenize(expr, self.vars)
+        self.operands = []
+        self.operators = []
+
+    def parse(self):
+        _INTERN.clear()
+        operands = self.operands
+        operators = self.operators
+        depth = 0
+        expect_operand = True
+        for kind, value in self.tokens:
+            if expect_operand:
+                if kind == TOKEN_NUM:
+                    operands.append(ValueNode.make(int(value)))
+                    expect_operand = False
+                elif kind == TOKEN_VAR:
+                    operands.append(ValueNode.make(value))
+                    expect_operand = False
+                elif kind == TOKEN_LPAR:
+                    operators.append(value)
+                    depth += 1
+                elif kind == TOKEN_OP and value == '-':
+                    operators.append(_UNARY_MINUS)
+                else:
+                    raise SyntaxError("Неожиданный символ: '{}'".format(value))
+            elif kind == TOKEN_OP:
+                priority = _PRIO_TABLE[ord(value)]
+                while operators and _PRIO_TABLE[ord(operators[-1])] >= priority:
+                    self._reduce()
+                operators.append(value)
+                expect_operand = True
+            elif kind == TOKEN_RPAR and depth:
+                while operators[-1] != '(':
+                    self._reduce()
+                operators.pop()
+                depth -= 1
+            elif kind != TOKEN_END:
+                if depth:
+                    raise SyntaxError("Ожидалась закрывающая скобка.")
+                raise SyntaxError("Неожиданные символы в конце выражения.")
+
+        while operators:
+            if operators[-1] == '(':
                 raise SyntaxError("Ожидалась закрывающая скобка.")
-            consume()
-            return node
-        if ch.isdigit():
-            return parse_number()
-        if ch.isalpha():
-            return ValueNode(consume())
-        raise SyntaxError("Неожиданный символ: '{}'".format(ch))
-
-    def parse_unary():
-        if current() == '-':
-            consume()
-            return UnaryMinusNode(parse_unary())
-        return parse_primary()
-
-    def parse_expression_inner(min_priority=0):
-        node = parse_unary()
-        while current() != '' and current() in '+-*/' and priority(current()) >= min_priority:
-            op = consume()
-            right = parse_expression_inner(priority(op) + 1)
-            node = BinaryOpNode(op, node, right)
-        return node
+            self._reduce()
+        tree = operands.pop()
+        _SIMPLIFY_CACHE.clear()
+        return tree
 
-    tree = parse_expression_inner()
-    if pos != len(expr):
-        raise SyntaxError("Неожиданные символы в конце выражения.")
-    return tree
+    def _reduce(self):
+        op = self.operators.pop()
+        right = self.operands.pop()
+        if op == _UNARY_MINUS:
+            self.operands.append(UnaryMinusNode.make(right))
+        else:
+            self.operands.append(BinaryOpNode.make(op, self.operands.pop(), right))
+
+
+def parse_expression(expr):
+    return Parser(expr).parse()
 
 
 def main():
     try:
         expr = input("Введите инфиксную формулу (например, a*c + b*c): ").strip()
-        tree = parse_expression(expr)
+        parser = Parser(expr)
+        tree = parser.parse()
 
         print("Исходное выражение:", tree.to_infix())
 
@@ -184,16 +702,22 @@ def main():
 
         if input("Вычислить выражение? (y/n): ").strip().lower() == 'y':
             variables = {}
-            for ch in sorted(set(filter(str.isalpha, expr))):
+            for ch in sorted(parser.vars):
                 while True:
                     try:
-                        value = int(input("Введите значение переменной '{}': ".format(ch)))
-                        variables[ch] = value
+                        text = input("Введите значение переменной '{}' "
+                                     "(несколько значений — через запятую): ".format(ch))
+                        variables[ch] = [int(part) for part in text.split(',')]
                         break
                     except ValueError:
                         print("Ошибка: требуется целое число.")
-            result = simplified.evaluate(variables)
-            print("Результат:", result)
+            if any(len(values) > 1 for values in variables.values()):
+                results = simplified.evaluate_batch(variables)
+                print("Результаты:", ", ".join(str(result) for result in results))
+            else:
+                variables = {name: values[0] for name, values in variables.items()}
+                result = simplified.evaluate(variables)
+                print("Результат:", result)
 
     except (ValueError, SyntaxError, ZeroDivisionError) as e:
         print("Ошибка:", e)